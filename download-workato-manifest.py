@@ -1,41 +1,62 @@
 #!/usr/bin/env python3
 """
-Export Workato packages (manifest -> package -> download) with cleanup prompts.
+Export Workato packages (manifest -> package -> download) with a cleanup prompt.
 
-Flow (per selected project):
+Flow (per selected project, up to --concurrency projects at a time):
  1) Create export manifest (assets from --assets-file or auto_generate_assets via --folder-id).
  2) Export package from that manifest (poll until completed).
  3) Download the package zip.
- 4) Show package JSON and prompt to delete it.
- 5) Show manifest JSON and prompt to delete it.
+Once every project has been processed:
+ 4) Show each package JSON (as last polled, or re-fetched with --refresh-before-delete)
+    and manifest JSON (as created, or re-fetched).
+ 5) Prompt once, then delete all packages and then all manifests in parallel.
 
 Docs used: https://docs.workato.com/en/workato-api/recipe-lifecycle-management.html
 
 Requirements:
   - Python 3.8+
   - requests (pip install requests)
+  - orjson (optional, pip install orjson) for faster JSON pretty-printing
+  - brotli (optional, pip install brotli) to accept Brotli-compressed API responses
 """
 
 import argparse
+import concurrent.futures
 import getpass
 import json
 import os
+import random
 import re
+import shutil
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 try:
     import requests
     from requests import Session
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:  # pragma: no cover - dependency hint
     print("The 'requests' package is required. Install it with: pip install requests", file=sys.stderr)
     sys.exit(1)
 
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is used instead
+    orjson = None
+
 
 DEFAULT_BASE_URL = "https://www.workato.com"
 
+# Every call targets the same host, so keep connections alive and pooled
+DEFAULT_POOL_SIZE = 32
+DEFAULT_CONCURRENCY = 6
+CLEANUP_CONCURRENCY = 16
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
 # Recipe lifecycle management endpoints (from official docs)
 EXPORT_MANIFEST_CREATE = "/api/export_manifests"
 EXPORT_MANIFEST_VIEW = "/api/export_manifests/{manifest_id}"
@@ -45,6 +66,21 @@ PACKAGE_VIEW = "/api/packages/{package_id}"
 PACKAGE_DOWNLOAD = "/api/packages/{package_id}/download"
 PACKAGE_DELETE = "/api/packages/{package_id}"
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+_SLUG_RE = re.compile(r"[^a-zA-Z0-9._-]+")
+_CD_RE = re.compile(r'filename="?([^";]+)"?')
+
+# Serializes output from worker threads so lines never interleave
+_print_lock = threading.Lock()
+
+# Download paths already taken in this run, so parallel workers never share one
+_claimed_paths: Set[Path] = set()
+_claimed_paths_lock = threading.Lock()
+
+# URL -> (ETag, parsed JSON) for conditional GETs on repeatedly polled resources
+_etag_cache: Dict[str, Tuple[str, Any]] = {}
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -116,7 +152,7 @@ def parse_args() -> argparse.Namespace:
         "--poll-interval",
         type=int,
         default=3,
-        help="Seconds between polling package status during export (default: %(default)s).",
+        help="Maximum seconds between package status polls during export (default: %(default)s).",
     )
     parser.add_argument(
         "--poll-timeout",
@@ -126,12 +162,23 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--output-zip-name",
-        help="Override downloaded package filename (defaults to server-provided).",
+        help="Override downloaded package filename (defaults to server-provided). Single project only.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Number of projects exported and downloaded in parallel (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--refresh-before-delete",
+        action="store_true",
+        help="Re-fetch package and manifest details from the API before the delete prompts.",
     )
     parser.add_argument(
         "--yes",
         action="store_true",
-        help="Skip confirmation prompts for deletions.",
+        help="Skip the confirmation prompt for deletions.",
     )
     return parser.parse_args()
 
@@ -146,9 +193,22 @@ def ensure_token(token: Optional[str]) -> str:
     return entered
 
 
-def build_session(token: str) -> Session:
+def build_session(token: str, pool_size: int = DEFAULT_POOL_SIZE) -> Session:
     session = requests.Session()
-    session.headers.update({"Authorization": f"Bearer {token}"})
+    session.headers.update({"Authorization": f"Bearer {token}", "Connection": "keep-alive"})
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False,  # hand the last response back so raise_for_status() reports it
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
     return session
 
 
@@ -166,6 +226,18 @@ def fallback_base_urls(user_base: str) -> List[str]:
     return candidates
 
 
+def discover_base(session: Session, user_base: str) -> str:
+    # The working host is fixed for a tenant, so probe it once per run. Only a
+    # 404 moves on to the next host; connection errors propagate rather than
+    # sending the token to a host the user did not ask for.
+    candidates = fallback_base_urls(user_base)
+    for candidate_base in candidates:
+        resp = session.head(f"{candidate_base}/api/projects", timeout=10)
+        if resp.status_code != 404:
+            return candidate_base
+    raise RuntimeError(f"No base URL worked (tried {candidates}).")
+
+
 def extract_projects(payload: Any) -> List[Dict[str, Any]]:
     if isinstance(payload, list):
         return [p for p in payload if isinstance(p, dict)]
@@ -199,7 +271,7 @@ def fetch_projects(session: Session, base_url: str, page_size: int) -> List[Dict
 
 
 def slugify(value: str) -> str:
-    cleaned = re.sub(r"[^a-zA-Z0-9._-]+", "-", value).strip("-")
+    cleaned = _SLUG_RE.sub("-", value).strip("-")
     return cleaned or "project"
 
 
@@ -340,11 +412,23 @@ def export_package(session: Session, base_url: str, manifest_id: Any) -> Dict[st
     return resp.json()
 
 
+def _cached_get(session: Session, url: str) -> Any:
+    cached = _etag_cache.get(url)
+    headers = {"If-None-Match": cached[0]} if cached else None
+    resp = session.get(url, headers=headers, timeout=30)
+    if cached and resp.status_code == 304:
+        return cached[1]
+    resp.raise_for_status()
+    data = resp.json()
+    etag = resp.headers.get("ETag")
+    if etag:
+        _etag_cache[url] = (etag, data)
+    return data
+
+
 def get_package(session: Session, base_url: str, package_id: Any) -> Dict[str, Any]:
     url = f"{base_url.rstrip('/')}{PACKAGE_VIEW.format(package_id=package_id)}"
-    resp = session.get(url, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+    return _cached_get(session, url)
 
 
 def wait_for_package(
@@ -354,17 +438,32 @@ def wait_for_package(
     poll_interval: int,
     poll_timeout: int,
 ) -> Dict[str, Any]:
+    # Workato offers no completion callback for package exports, so poll with
+    # exponential backoff (0.5s, 1s, 2s, ... capped at poll_interval) plus jitter.
     deadline = time.time() + poll_timeout
+    max_delay = max(1, poll_interval)
+    delay = 0.5
     last = get_package(session, base_url, package_id)
     while time.time() < deadline:
         status = (last.get("status") or "").lower()
         if status in {"completed", "failed"}:
             return last
-        time.sleep(max(1, poll_interval))
+        time.sleep(min(max_delay, delay) + random.uniform(0, delay * 0.1))
+        delay = min(max_delay, delay * 2)
         last = get_package(session, base_url, package_id)
     raise TimeoutError(f"Package {package_id} did not complete within {poll_timeout}s")
 
 
+def claim_output_path(output_dir: Path, filename: str, package_id: Any) -> Path:
+    output_path = output_dir / filename
+    with _claimed_paths_lock:
+        if output_path in _claimed_paths:
+            # Another project in this run got the same server filename
+            output_path = output_dir / f"{output_path.stem}-{package_id}{output_path.suffix}"
+        _claimed_paths.add(output_path)
+    return output_path
+
+
 def download_package_zip(
     session: Session,
     base_url: str,
@@ -379,7 +478,14 @@ def download_package_zip(
     download_endpoint = f"{base_url.rstrip('/')}{PACKAGE_DOWNLOAD.format(package_id=package_id)}"
 
     def _fetch(url: str) -> requests.Response:
-        resp = session.get(url, timeout=60, stream=True, allow_redirects=True)
+        # The zip is already compressed; ask for it as-is
+        resp = session.get(
+            url,
+            headers={"Accept-Encoding": "identity"},
+            timeout=60,
+            stream=True,
+            allow_redirects=True,
+        )
         resp.raise_for_status()
         return resp
 
@@ -395,24 +501,38 @@ def download_package_zip(
     filename = override_name or f"package-{package_id}.zip"
     cd = resp.headers.get("Content-Disposition")
     if not override_name and cd:
-        match = re.search(r'filename=\"?([^\";]+)\"?', cd)
+        match = _CD_RE.search(cd)
         if match:
             filename = match.group(1)
 
     output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / filename
-    with output_path.open("wb") as fh:
-        for chunk in resp.iter_content(chunk_size=8192):
-            if chunk:
-                fh.write(chunk)
+    output_path = claim_output_path(output_dir, filename, package_id)
+    # Write to a temp file unique to this package and process, then rename on
+    # success, so a failed download never leaves a truncated zip under the final name
+    tmp_path = output_path.with_name(f"{output_path.name}.{package_id}.{os.getpid()}.part")
+    total_size = int(resp.headers.get("Content-Length") or 0)
+    resp.raw.decode_content = True
+    fh = tmp_path.open("xb")
+    try:
+        with fh:
+            if total_size and hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(fh.fileno(), 0, total_size)
+                except OSError:
+                    pass  # filesystem does not support preallocation
+            shutil.copyfileobj(resp.raw, fh, length=DOWNLOAD_CHUNK_SIZE)
+            # Content-Length may not match the decoded size; drop any preallocated tail
+            fh.truncate()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
     return output_path
 
 
 def view_manifest(session: Session, base_url: str, manifest_id: Any) -> Dict[str, Any]:
     url = f"{base_url.rstrip('/')}{EXPORT_MANIFEST_VIEW.format(manifest_id=manifest_id)}"
-    resp = session.get(url, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
+    data = _cached_get(session, url)
     return data.get("result") or data
 
 
@@ -430,6 +550,20 @@ def delete_manifest(session: Session, base_url: str, manifest_id: Any) -> Dict[s
     return resp.json()
 
 
+def log(message: str, error: bool = False) -> None:
+    with _print_lock:
+        print(message, file=sys.stderr if error else sys.stdout)
+
+
+def _dumps_pretty(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS).decode()
+        except TypeError:  # e.g. integers beyond 64 bits, which stdlib json handles
+            pass
+    return json.dumps(obj, indent=2, sort_keys=True)
+
+
 def prompt_yes_no(message: str, default_no: bool = True, assume_yes: bool = False) -> bool:
     if assume_yes:
         return True
@@ -440,115 +574,183 @@ def prompt_yes_no(message: str, default_no: bool = True, assume_yes: bool = Fals
     return choice in {"y", "yes"}
 
 
+def resolve_manifest_payload(project: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    # May prompt for a folder_id, so this runs before any worker is started
+    project_name = project.get("name") or project.get("title") or project.get("id")
+    folder_id = args.folder_id
+    if not args.assets_file and folder_id is None:
+        if args.yes:
+            project_folder_raw = project.get("folder_id")
+            folder_id = int(project_folder_raw) if project_folder_raw is not None else 0
+            print(f"Using project folder_id={folder_id} for '{project_name}' (auto-selected).")
+        else:
+            folder_id = prompt_folder_id(project)
+    return build_manifest_payload(project_name or "project", args, folder_id)
+
+
+def process_project(
+    project: Dict[str, Any],
+    manifest_payload: Dict[str, Any],
+    args: argparse.Namespace,
+    session: Session,
+    working_base: str,
+    output_dir: Path,
+) -> Optional[Dict[str, Any]]:
+    project_name = project.get("name") or project.get("title") or project.get("id")
+    try:
+        manifest = create_export_manifest(session, working_base, manifest_payload)
+    except Exception as exc:  # noqa: BLE001
+        log(f"Failed to create export manifest for '{project_name}': {exc}", error=True)
+        return None
+    manifest_id = manifest["id"]
+    log(f"Created export manifest {manifest_id} for project '{project_name}' (base: {working_base}).")
+
+    try:
+        package_meta = export_package(session, working_base, manifest_id)
+        package_id = package_meta.get("id")
+        if not package_id:
+            raise RuntimeError(f"Unexpected package export response: {package_meta}")
+        log(f"Started package export {package_id} from manifest {manifest_id} for '{project_name}'.")
+        package_final = wait_for_package(
+            session,
+            working_base,
+            package_id,
+            args.poll_interval,
+            args.poll_timeout,
+        )
+        status = package_final.get("status")
+        log(f"Package {package_id} status: {status}")
+        if status != "completed":
+            raise RuntimeError(f"Package export failed or incomplete: {package_final}")
+        zip_path = download_package_zip(
+            session,
+            working_base,
+            package_final,
+            output_dir=output_dir,
+            override_name=args.output_zip_name,
+        )
+        log(f"Downloaded package {package_id} to {zip_path}")
+    except Exception as exc:  # noqa: BLE001
+        log(f"Failed to export/download package for '{project_name}': {exc}", error=True)
+        return None
+
+    return {
+        "working_base": working_base,
+        "manifest_id": manifest_id,
+        "manifest": manifest,
+        "package_id": package_id,
+        "package": package_final,
+    }
+
+
+def review_project(result: Dict[str, Any], args: argparse.Namespace, session: Session) -> None:
+    working_base = result["working_base"]
+    package_id = result["package_id"]
+    manifest_id = result["manifest_id"]
+
+    try:
+        if args.refresh_before_delete:
+            package_latest = get_package(session, working_base, package_id)
+        else:
+            package_latest = result["package"]
+        print(f"Package details (review before delete):\n{_dumps_pretty(package_latest)}")
+    except Exception as exc:  # noqa: BLE001
+        print(f"Error while fetching package {package_id}: {exc}", file=sys.stderr)
+
+    try:
+        if args.refresh_before_delete:
+            manifest_view = view_manifest(session, working_base, manifest_id)
+        else:
+            manifest_view = result["manifest"]
+        print(f"Manifest details (review before delete):\n{_dumps_pretty(manifest_view)}")
+    except Exception as exc:  # noqa: BLE001
+        print(f"Error while fetching manifest {manifest_id}: {exc}", file=sys.stderr)
+
+
+def cleanup_package(session: Session, result: Dict[str, Any]) -> None:
+    package_id = result["package_id"]
+    try:
+        delete_resp = delete_package(session, result["working_base"], package_id)
+        log(f"Deleted package {package_id}: {delete_resp}")
+    except Exception as exc:  # noqa: BLE001
+        log(f"Error while deleting package {package_id}: {exc}", error=True)
+
+
+def cleanup_manifest(session: Session, result: Dict[str, Any]) -> None:
+    manifest_id = result["manifest_id"]
+    try:
+        delete_resp = delete_manifest(session, result["working_base"], manifest_id)
+        log(f"Deleted manifest {manifest_id}: {delete_resp}")
+    except Exception as exc:  # noqa: BLE001
+        log(f"Error while deleting manifest {manifest_id}: {exc}", error=True)
+
+
+def cleanup_exports(
+    cleanup_queue: List[Dict[str, Any]], args: argparse.Namespace, session: Session
+) -> None:
+    if not cleanup_queue:
+        return
+    for result in cleanup_queue:
+        review_project(result, args, session)
+
+    count = len(cleanup_queue)
+    if not prompt_yes_no(
+        f"Delete all {count} package(s) and export manifest(s) listed above?",
+        default_no=True,
+        assume_yes=args.yes,
+    ):
+        return
+
+    # Delete packages before the manifests they were exported from
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(CLEANUP_CONCURRENCY, count)) as executor:
+        list(executor.map(lambda result: cleanup_package(session, result), cleanup_queue))
+        list(executor.map(lambda result: cleanup_manifest(session, result), cleanup_queue))
+
+
 def main() -> None:
     args = parse_args()
     token = ensure_token(args.token)
-    session = build_session(token)
-    projects = fetch_projects(session, args.base_url, args.page_size)
+    concurrency = max(1, args.concurrency)
+    session = build_session(token, pool_size=max(DEFAULT_POOL_SIZE, concurrency))
+    try:
+        working_base = discover_base(session, args.base_url)
+    except (RuntimeError, requests.RequestException) as exc:
+        print(f"Unable to reach the Workato API: {exc}", file=sys.stderr)
+        sys.exit(1)
+    projects = fetch_projects(session, working_base, args.page_size)
 
     if args.project_ids:
         selected_projects = find_projects_by_id(args.project_ids, projects)
     else:
         selected_projects = prompt_project_selection(projects)
 
+    if args.output_zip_name and len(selected_projects) > 1:
+        print(
+            "--output-zip-name can only be used when a single project is selected.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
     output_dir = Path(args.output_dir)
 
+    # Gather any interactive input up front so the workers never block on a prompt
+    prepared: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
     for project in selected_projects:
         project_name = project.get("name") or project.get("title") or project.get("id")
         try:
-            folder_id = args.folder_id
-            if not args.assets_file and folder_id is None:
-                if args.yes:
-                    project_folder_raw = project.get("folder_id")
-                    folder_id = int(project_folder_raw) if project_folder_raw is not None else 0
-                    print(f"Using project folder_id={folder_id} for '{project_name}' (auto-selected).")
-                else:
-                    folder_id = prompt_folder_id(project)
-            manifest_payload = build_manifest_payload(project_name or "project", args, folder_id)
+            prepared.append((project, resolve_manifest_payload(project, args)))
         except Exception as exc:  # noqa: BLE001
             print(f"Skipping project '{project_name}': {exc}", file=sys.stderr)
-            continue
 
-        manifest = None
-        working_base = None
-        for candidate_base in fallback_base_urls(args.base_url):
-            try:
-                manifest = create_export_manifest(session, candidate_base, manifest_payload)
-                working_base = candidate_base
-                break
-            except requests.HTTPError as exc:
-                if exc.response is not None and exc.response.status_code == 404:
-                    # Try the next base URL on hard 404s (path not found)
-                    continue
-                raise
-        if manifest is None or working_base is None:
-            print(
-                f"Failed to create export manifest for '{project_name}': "
-                f"No base URL worked (tried {fallback_base_urls(args.base_url)}).",
-                file=sys.stderr,
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(
+                lambda item: process_project(item[0], item[1], args, session, working_base, output_dir),
+                prepared,
             )
-            continue
-        manifest_id = manifest["id"]
-        print(f"Created export manifest {manifest_id} for project '{project_name}' (base: {working_base}).")
+        )
 
-        try:
-            package_meta = export_package(session, working_base, manifest_id)
-            package_id = package_meta.get("id")
-            if not package_id:
-                raise RuntimeError(f"Unexpected package export response: {package_meta}")
-            print(f"Started package export {package_id} from manifest {manifest_id} for '{project_name}'.")
-            package_final = wait_for_package(
-                session,
-                working_base,
-                package_id,
-                args.poll_interval,
-                args.poll_timeout,
-            )
-            status = package_final.get("status")
-            print(f"Package {package_id} status: {status}")
-            if status != "completed":
-                raise RuntimeError(f"Package export failed or incomplete: {package_final}")
-            zip_path = download_package_zip(
-                session,
-                working_base,
-                package_final,
-                output_dir=output_dir,
-                override_name=args.output_zip_name,
-            )
-            print(f"Downloaded package {package_id} to {zip_path}")
-        except Exception as exc:  # noqa: BLE001
-            print(f"Failed to export/download package for '{project_name}': {exc}", file=sys.stderr)
-            continue
-
-        # Confirm and delete package
-        try:
-            package_latest = get_package(session, working_base, package_id)
-            package_json = json.dumps(package_latest, indent=2)
-            print(f"Package details (review before delete):\n{package_json}")
-            if prompt_yes_no(
-                f"Delete package {package_id} now?",
-                default_no=True,
-                assume_yes=args.yes,
-            ):
-                delete_resp = delete_package(session, working_base, package_id)
-                print(f"Deleted package {package_id}: {delete_resp}")
-        except Exception as exc:  # noqa: BLE001
-            print(f"Error while deleting package {package_id}: {exc}", file=sys.stderr)
-
-        # Confirm and delete manifest
-        try:
-            manifest_view = view_manifest(session, working_base, manifest_id)
-            manifest_json = json.dumps(manifest_view, indent=2)
-            print(f"Manifest details (review before delete):\n{manifest_json}")
-            if prompt_yes_no(
-                f"Delete export manifest {manifest_id} now?",
-                default_no=True,
-                assume_yes=args.yes,
-            ):
-                delete_resp = delete_manifest(session, working_base, manifest_id)
-                print(f"Deleted manifest {manifest_id}: {delete_resp}")
-        except Exception as exc:  # noqa: BLE001
-            print(f"Error while deleting manifest {manifest_id}: {exc}", file=sys.stderr)
+    cleanup_exports([result for result in results if result is not None], args, session)
 
 
 if __name__ == "__main__":
@@ -1,70 +1,94 @@
+import functools
 import json
-from dataclasses import dataclass
+import re
+from concurrent.futures import ThreadPoolExecutor
 from html import escape
-from typing import Any, Dict, List, Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
+try:
+    import orjson
+except ImportError:  # not available in every runtime, stdlib json is used instead
+    orjson = None
 
-@dataclass
-class VariableToken:
-    name: str
 
+# Templates compile to a flat instruction list:
+#   (OP_TEXT, text)
+#   (OP_VAR, name_parts)
+#   (OP_SECTION_START, name, name_parts, end_index, inverted)  end_index -> matching OP_SECTION_END
+#   (OP_SECTION_END, start_index)
+OP_TEXT = 0
+OP_VAR = 1
+OP_SECTION_START = 2
+OP_SECTION_END = 3
 
-@dataclass
-class SectionToken:
-    name: str
-    tokens: List[Any]
-    inverted: bool = False
+Instruction = Tuple[Any, ...]
 
+_MISSING = object()
 
-Token = Any
+# Values looked up by attribute only when they are not one of these
+_PLAIN_TYPES = (str, bytes, int, float, bool, list, tuple, set, dict)
 
+_HTML_SPECIAL_CHARS = frozenset("&<>\"'")
 
-def parse_template(template: str) -> List[Token]:
-    tokens: List[Token] = []
-    stack: List[List[Token]] = [tokens]
-    section_stack: List[SectionToken] = []
-    idx = 0
+# Each match runs from a "{{" to the first "}}" after it
+_TAG_RE = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
 
-    while idx < len(template):
-        start = template.find("{{", idx)
-        if start == -1:
-            stack[-1].append(template[idx:])
-            break
 
-        if start > idx:
-            stack[-1].append(template[idx:start])
+def split_name(name: str) -> Tuple[str, ...]:
+    # "." refers to the current context itself
+    return () if name == "." else tuple(name.split("."))
 
-        end = template.find("}}", start)
-        if end == -1:
-            raise ValueError("Unclosed tag in template")
 
-        tag_content = template[start + 2 : end].strip()
-        idx = end + 2
+# Workato runs this step once per failed job, usually with the same template;
+# the result is a tuple so the cached program cannot be mutated by callers.
+@functools.lru_cache(maxsize=32)
+def parse_template(template: str) -> Tuple[Instruction, ...]:
+    program: List[Instruction] = []
+    section_stack: List[int] = []
+    last = 0
+    # No tag can close past the last "}}", so stop scanning there; an opener
+    # after it is unclosed and is reported below without a rescan per "{{".
+    scan_end = template.rfind("}}") + 2
 
+    for match in _TAG_RE.finditer(template, 0, scan_end):
+        start = match.start()
+        if start > last:
+            program.append((OP_TEXT, template[last:start]))
+        last = match.end()
+
+        tag_content = match.group(1).strip()
         if not tag_content:
             continue
 
         marker = tag_content[0]
         if marker in ("#", "^"):
             name = tag_content[1:].strip()
-            section = SectionToken(name=name, tokens=[], inverted=marker == "^")
-            stack[-1].append(section)
-            stack.append(section.tokens)
-            section_stack.append(section)
+            section_stack.append(len(program))
+            # end_index is patched once the closing tag is found
+            program.append((OP_SECTION_START, name, split_name(name), -1, marker == "^"))
         elif marker == "/":
             name = tag_content[1:].strip()
-            if not section_stack or section_stack[-1].name != name:
+            if not section_stack or program[section_stack[-1]][1] != name:
                 raise ValueError(f"Mismatched closing tag: {name}")
-            section_stack.pop()
-            stack.pop()
+            start_index = section_stack.pop()
+            _, section_name, parts, _, inverted = program[start_index]
+            program[start_index] = (OP_SECTION_START, section_name, parts, len(program), inverted)
+            program.append((OP_SECTION_END, start_index))
         else:
-            stack[-1].append(VariableToken(name=tag_content))
+            program.append((OP_VAR, split_name(tag_content)))
+
+    tail = template[last:]
+    if "{{" in tail:
+        raise ValueError("Unclosed tag in template")
+    if tail:
+        program.append((OP_TEXT, tail))
 
     if section_stack:
-        unclosed = ", ".join(section.name for section in section_stack)
+        unclosed = ", ".join(program[index][1] for index in section_stack)
         raise ValueError(f"Unclosed sections: {unclosed}")
 
-    return tokens
+    return tuple(program)
 
 
 def is_truthy(value: Any) -> bool:
@@ -79,77 +103,115 @@ def is_truthy(value: Any) -> bool:
     return bool(value)
 
 
-def resolve_name(name: str, context_stack: Sequence[Any]) -> Any:
-    if name == ".":
+def escape_value(value: Any) -> str:
+    text = value if type(value) is str else str(value)
+    # Most values (ids, numbers, names) need no escaping; skip the copy for them
+    if _HTML_SPECIAL_CHARS.isdisjoint(text):
+        return text
+    return escape(text)
+
+
+def resolve_name(parts: Tuple[str, ...], context_stack: Sequence[Any]) -> Any:
+    if not parts:
         return context_stack[-1]
 
-    parts = name.split(".")
     for context in reversed(context_stack):
         value = context
-        matched = True
         for part in parts:
-            if isinstance(value, dict) and part in value:
-                value = value[part]
-            elif not isinstance(
-                value, (str, bytes, int, float, bool, list, tuple, set, dict)
-            ) and hasattr(value, part):
-                value = getattr(value, part)
+            if type(value) is dict or isinstance(value, dict):
+                value = value.get(part, _MISSING)
+            elif isinstance(value, _PLAIN_TYPES):
+                value = _MISSING
             else:
-                matched = False
+                value = getattr(value, part, _MISSING)
+            if value is _MISSING:
                 break
-        if matched:
+        else:
             return value
     return None
 
 
-def render_tokens(tokens: Sequence[Token], context_stack: List[Any]) -> str:
+def render_tokens(program: Sequence[Instruction], context_stack: List[Any]) -> str:
+    # context_stack is owned by the render: sections push and pop on it in place
+    # and it is back to its original contents when this returns.
     rendered: List[str] = []
-
-    for token in tokens:
-        if isinstance(token, str):
-            rendered.append(token)
-        elif isinstance(token, VariableToken):
-            value = resolve_name(token.name, context_stack)
-            rendered.append("" if value is None else escape(str(value)))
-        elif isinstance(token, SectionToken):
-            value = resolve_name(token.name, context_stack)
-            if token.inverted:
-                if not is_truthy(value):
-                    rendered.append(render_tokens(token.tokens, context_stack.copy()))
+    # One frame per open section: whether it pushed a context, and the items
+    # still to render for list sections.
+    frames: List[Tuple[bool, Optional[Iterator[Any]]]] = []
+    pc = 0
+    size = len(program)
+
+    while pc < size:
+        instruction = program[pc]
+        op = instruction[0]
+        if op == OP_TEXT:
+            rendered.append(instruction[1])
+        elif op == OP_VAR:
+            value = resolve_name(instruction[1], context_stack)
+            if value is not None:
+                rendered.append(escape_value(value))
+        elif op == OP_SECTION_START:
+            _, _, parts, end_index, inverted = instruction
+            value = resolve_name(parts, context_stack)
+            if inverted:
+                if is_truthy(value):
+                    pc = end_index + 1
+                    continue
+                frames.append((False, None))
+            elif isinstance(value, (list, tuple)):
+                items = iter(value)
+                item = next(items, _MISSING)
+                if item is _MISSING:
+                    pc = end_index + 1
+                    continue
+                context_stack.append(item)
+                frames.append((True, items))
+            elif isinstance(value, dict) or is_truthy(value):
+                context_stack.append(value)
+                frames.append((True, None))
             else:
-                if isinstance(value, (list, tuple)):
-                    for item in value:
-                        rendered.append(render_tokens(token.tokens, context_stack + [item]))
-                elif isinstance(value, dict):
-                    rendered.append(render_tokens(token.tokens, context_stack + [value]))
-                elif is_truthy(value):
-                    rendered.append(render_tokens(token.tokens, context_stack + [value]))
+                pc = end_index + 1
+                continue
+        elif op == OP_SECTION_END:
+            pushed, items = frames[-1]
+            if pushed:
+                context_stack.pop()
+            if items is not None:
+                item = next(items, _MISSING)
+                if item is not _MISSING:
+                    context_stack.append(item)
+                    pc = instruction[1] + 1
+                    continue
+            frames.pop()
         else:
-            raise TypeError(f"Unknown token type: {token}")
+            raise TypeError(f"Unknown instruction: {instruction}")
+        pc += 1
 
     return "".join(rendered)
 
 
 def render(template: str, data: Dict[str, Any]) -> str:
-    tokens = parse_template(template)
-    return render_tokens(tokens, [data])
+    program = parse_template(template)
+    return render_tokens(program, [data])
 
 
 def main(input: dict) -> Dict[str, str]:
     template = input.get("template", "")
     data = input.get("data", {})
-    data["system_name"] = "Workato"
-    data["job_id"] = data.get("job_url", "unknown").split("/")[-1]
-    data["recipe_id"] = data.get("recipe_url", "unknown").split("/")[-1]
+    data.setdefault("system_name", "Workato")
+    data["job_id"] = data.get("job_url", "unknown").rpartition("/")[2] or "unknown"
+    data["recipe_id"] = data.get("recipe_url", "unknown").rpartition("/")[2] or "unknown"
     rendered_html = render(template, data)
     return {'error_body': rendered_html}
 
 
 if __name__ == '__main__':
-    with open('data/error_template_v1.html', 'r') as t, open('data/error_message_data.json', 'r') as d:
-        template = t.read()
-        data = json.load(d)
-    error_body = main(template, data)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        template_future = executor.submit(Path('data/error_template_v1.html').read_text)
+        data_future = executor.submit(Path('data/error_message_data.json').read_bytes)
+        template = template_future.result()
+        data = (orjson.loads if orjson is not None else json.loads)(data_future.result())
+    error_body = main({'template': template, 'data': data})
 
     with open('data/error_message_v1_imputed.html', 'w') as f:
         f.write(error_body['error_body'])